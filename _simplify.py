@@ -0,0 +1,166 @@
+import heapq
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # Numba is optional; the kernels then run as plain Python
+    njit = lambda **kw: (lambda f: f)
+
+
+# Kernel for Grid-based Subsampling
+@njit(cache=True)
+def grid_nb(pts, g):
+    """
+    Selects the first point falling in each grid cell, keeping the original order.
+
+    Parameters:
+    pts (np.ndarray): Array of shape (n, 2) with the path coordinates.
+    g (float): Size of the grid cells.
+
+    Returns:
+    np.ndarray: Subsampled coordinates.
+    """
+    n = pts.shape[0]
+    keep = np.zeros(n, dtype=np.bool_)
+    seen = {}
+    for i in range(n):
+        key = (np.int64(round(pts[i, 0] / g)), np.int64(round(pts[i, 1] / g)))  # Calculate grid cell key
+        if key not in seen:
+            seen[key] = i
+            keep[i] = True
+    return pts[keep]
+
+# Kernel for Sliding Window Subsampling
+@njit(cache=True)
+def sliding_mid_nb(pts, w):
+    """
+    Selects the middle point of each window of w consecutive points.
+
+    Parameters:
+    pts (np.ndarray): Array of shape (n, 2) with the path coordinates.
+    w (int): Size of the sliding window.
+
+    Returns:
+    np.ndarray: Subsampled coordinates.
+    """
+    n = pts.shape[0]
+    n_out = (n + w - 1) // w
+    out = np.empty((n_out, 2), dtype=pts.dtype)
+    for j in range(n_out):
+        start = j * w
+        length = min(w, n - start)  # The last window may be shorter
+        out[j, 0] = pts[start + length // 2, 0]
+        out[j, 1] = pts[start + length // 2, 1]
+    return out
+
+# Kernel for Ramer-Douglas-Peucker Simplification
+@njit(cache=True)
+def rdp_nb(pts, eps):
+    """
+    Simplifies a path with the Ramer-Douglas-Peucker algorithm, measuring each point's distance
+    to the segment between the current endpoints. Uses an explicit index stack instead of recursion.
+
+    Parameters:
+    pts (np.ndarray): Array of shape (n, 2) with the path coordinates.
+    eps (float): Maximum distance for a point to be dropped.
+
+    Returns:
+    np.ndarray: Simplified coordinates, in original order.
+    """
+    n = pts.shape[0]
+    if n < 3:
+        return pts.copy()
+    keep = np.zeros(n, dtype=np.bool_)
+    keep[0] = True
+    keep[n - 1] = True
+    eps2 = eps * eps
+    stack = np.empty((n, 2), dtype=np.int64)
+    stack[0, 0] = 0
+    stack[0, 1] = n - 1
+    top = 1
+    while top > 0:
+        top -= 1
+        start = stack[top, 0]
+        end = stack[top, 1]
+        ax = pts[start, 0]
+        ay = pts[start, 1]
+        vx = pts[end, 0] - ax
+        vy = pts[end, 1] - ay
+        seg_len2 = vx * vx + vy * vy
+        d2_max = -1.0
+        i_max = start
+        for i in range(start + 1, end):
+            wx = pts[i, 0] - ax
+            wy = pts[i, 1] - ay
+            t = 0.0
+            if seg_len2 > 0.0:
+                t = min(max((wx * vx + wy * vy) / seg_len2, 0.0), 1.0)  # Project onto the segment
+            dx = wx - t * vx
+            dy = wy - t * vy
+            d2 = dx * dx + dy * dy
+            if d2 > d2_max:
+                d2_max = d2
+                i_max = i
+        if d2_max > eps2:
+            keep[i_max] = True
+            # Only push halves that still have interior points; the stack never holds more than n - 1 entries
+            if i_max - start > 1:
+                stack[top, 0] = start
+                stack[top, 1] = i_max
+                top += 1
+            if end - i_max > 1:
+                stack[top, 0] = i_max
+                stack[top, 1] = end
+                top += 1
+    return pts[keep]
+
+# Function for Visvalingam-Whyatt Simplification
+def vw_numpy(pts, tol):
+    """
+    Simplifies a path with the Visvalingam-Whyatt algorithm, repeatedly removing the point whose
+    triangle with its neighbours has the smallest area until every remaining area is at least tol.
+    Initial areas are computed in one vectorized pass; removals use a min-heap with lazy deletion.
+
+    Parameters:
+    pts (np.ndarray): Array of shape (n, 2) with the path coordinates.
+    tol (float): Minimum triangle area for a point to be kept.
+
+    Returns:
+    np.ndarray: Simplified coordinates, in original order.
+    """
+    n = len(pts)
+    if n < 3:
+        return pts.copy()
+    x = pts[:, 0]
+    y = pts[:, 1]
+    areas = 0.5 * np.abs(x[:-2] * (y[1:-1] - y[2:]) + x[1:-1] * (y[2:] - y[:-2]) + x[2:] * (y[:-2] - y[1:-1]))
+
+    xs = x.tolist()
+    ys = y.tolist()
+
+    def triangle_area(i, j, k):
+        return 0.5 * abs(xs[i] * (ys[j] - ys[k]) + xs[j] * (ys[k] - ys[i]) + xs[k] * (ys[i] - ys[j]))
+
+    prev = list(range(-1, n - 1))
+    nxt = list(range(1, n + 1))
+    version = [0] * n
+    keep = np.ones(n, dtype=bool)
+    heap = [(area, 0, i) for i, area in enumerate(areas.tolist(), start=1)]
+    heapq.heapify(heap)
+    while heap:
+        area, v, i = heapq.heappop(heap)
+        if v != version[i]:
+            continue  # Stale entry, the point's area changed after it was pushed
+        if area >= tol:
+            break
+        keep[i] = False
+        p, q = prev[i], nxt[i]
+        nxt[p] = q
+        prev[q] = p
+        # Recompute the areas of the two neighbours, unless they are endpoints
+        for j in (p, q):
+            if 0 < j < n - 1:
+                version[j] += 1
+                heapq.heappush(heap, (triangle_area(prev[j], j, nxt[j]), version[j], j))
+    return pts[keep]
@@ -1,16 +1,29 @@
+import argparse
 import csv
 import os
-import random
 import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
 
 import geopandas as gpd
 import numpy as np
 import pandas as pd
-from memory_profiler import memory_usage
-from rdp import rdp
-from shapely.geometry import LineString, MultiPoint
-from simplification.cutil import simplify_coords_vw  # Visvalingam-Whyatt
-from tsmoothie.smoother import LowessSmoother
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyogrio
+import shapely
+from statsmodels.nonparametric.smoothers_lowess import lowess
+
+from _simplify import grid_nb, sliding_mid_nb
+
+try:
+    from simplification.cutil import simplify_coords, simplify_coords_vw  # Douglas-Peucker, Visvalingam-Whyatt
+except ImportError:  # simplification is optional; fall back to the equivalent kernels in _simplify
+    from _simplify import rdp_nb as simplify_coords, vw_numpy as simplify_coords_vw
+
+# Random generator used by random_subsampling
+_rng = np.random.default_rng()
 
 
 # Function to create synthetic flight paths data with sine waves
@@ -27,19 +40,23 @@ def create_flight_paths(num_points, num_paths):
     list: A list of Pandas DataFrames, each representing a synthetic flight path.
     """
     datasets = []
+    x = np.linspace(-3000000, 3000000, num_points)  # Generate x-coordinates over a large range, shared by all paths
+    wave = np.sin(x / 100000) * 3000000  # The sine wave is also shared; only the noise differs between paths
     for i in range(num_paths):
-        x = np.linspace(-3000000, 3000000, num_points)  # Generate x-coordinates over a large range
-        y = np.sin(x / 100000) * 3000000 + np.random.normal(0, 100000, num_points)  # Generate y-coordinates with sine wave and noise
-        df = pd.DataFrame({'ps71_easting': x, 'ps71_northing': y})
-        # Add metadata columns to simulate real-world flight path data
-        df['institution'] = 'SYNTHETIC'
-        df['region'] = 'antarctic'
-        df['campaign'] = f'2023_Synthetic_Campaign_{i+1}'
-        df['segment'] = f'20230101_0{i+1}'
-        df['granule'] = f'Data_20230101_0{i+1}_001'
-        df['availability'] = 's'
-        df['uri'] = None
-        df['name'] = f'SYNTHETIC_2023_Synthetic_Campaign_{i+1}_Data_20230101_0{i+1}_001'
+        y = wave + np.random.normal(0, 100000, num_points)  # Generate y-coordinates with sine wave and noise
+        # Build the frame in one go; scalar metadata columns simulate real-world flight path data and are broadcast
+        df = pd.DataFrame({
+            'ps71_easting': x,
+            'ps71_northing': y,
+            'institution': 'SYNTHETIC',
+            'region': 'antarctic',
+            'campaign': f'2023_Synthetic_Campaign_{i+1}',
+            'segment': f'20230101_0{i+1}',
+            'granule': f'Data_20230101_0{i+1}_001',
+            'availability': 's',
+            'uri': None,
+            'name': f'SYNTHETIC_2023_Synthetic_Campaign_{i+1}_Data_20230101_0{i+1}_001'
+        })
         datasets.append(df)
     return datasets
 
@@ -57,7 +74,7 @@ def save_csv_files(datasets):
     csv_filepaths = []
     for i, df in enumerate(datasets, start=1):
         csv_filepath = f'synthetic_data_{i}.csv'
-        df.to_csv(csv_filepath, index=False)  # Save DataFrame to CSV without row index
+        pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), csv_filepath)  # Save DataFrame to CSV without row index
         csv_filepaths.append(csv_filepath)
         print(f"Saved {csv_filepath}")
     return csv_filepaths
@@ -68,11 +85,11 @@ def uniform_subsampling(coords, step):
     Selects every nth point from the dataset for uniform subsampling.
 
     Parameters:
-    coords (list): List of coordinate tuples.
+    coords (np.ndarray): Array of shape (n, 2) with the path coordinates.
     step (int): Step size for subsampling.
 
     Returns:
-    list: Subsampled coordinates.
+    np.ndarray: Subsampled coordinates.
     """
     return coords[::step]
 
@@ -82,13 +99,14 @@ def random_subsampling(coords, n_out):
     Randomly selects a specified number of points from the dataset.
 
     Parameters:
-    coords (list): List of coordinate tuples.
+    coords (np.ndarray): Array of shape (n, 2) with the path coordinates.
     n_out (int): Number of points to select.
 
     Returns:
-    list: Randomly subsampled coordinates.
+    np.ndarray: Randomly subsampled coordinates.
     """
-    return random.sample(coords, min(n_out, len(coords)))
+    idx = _rng.choice(len(coords), min(n_out, len(coords)), replace=False)
+    return coords[idx]
 
 # Function for Sliding Window Subsampling
 def sliding_window_subsampling(coords, window_size):
@@ -96,18 +114,13 @@ def sliding_window_subsampling(coords, window_size):
     Selects the middle point of each window of specified size.
 
     Parameters:
-    coords (list): List of coordinate tuples.
+    coords (np.ndarray): Array of shape (n, 2) with the path coordinates.
     window_size (int): Size of the sliding window.
 
     Returns:
-    list: Subsampled coordinates.
+    np.ndarray: Subsampled coordinates.
     """
-    subsampled_coords = []
-    for i in range(0, len(coords), window_size):
-        window = coords[i:i + window_size]
-        if window:
-            subsampled_coords.append(window[len(window) // 2])  # Choose the middle point in the window
-    return subsampled_coords
+    return sliding_mid_nb(coords, window_size)  # Choose the middle point in each window
 
 # Function for Grid-based Subsampling
 def grid_subsampling(coords, grid_size):
@@ -115,20 +128,13 @@ def grid_subsampling(coords, grid_size):
     Selects one point per grid cell based on the specified grid size.
 
     Parameters:
-    coords (list): List of coordinate tuples.
+    coords (np.ndarray): Array of shape (n, 2) with the path coordinates.
     grid_size (int): Size of the grid cells.
 
     Returns:
-    list: Subsampled coordinates.
+    np.ndarray: Subsampled coordinates.
     """
-    grid_coords = []
-    grid_dict = {}
-    for coord in coords:
-        grid_key = (round(coord[0] / grid_size) * grid_size, round(coord[1] / grid_size) * grid_size)  # Calculate grid cell key
-        if grid_key not in grid_dict:
-            grid_dict[grid_key] = coord
-    grid_coords = list(grid_dict.values())
-    return grid_coords
+    return grid_nb(coords, grid_size)  # Keep the first point of each cell, in original order
 
 # Function for Lowess Smoothing Subsampling
 def lowess_subsampling(coords, frac):
@@ -136,17 +142,18 @@ def lowess_subsampling(coords, frac):
     Applies Lowess smoothing and selects points based on the smoothing fraction.
 
     Parameters:
-    coords (list): List of coordinate tuples.
+    coords (np.ndarray): Array of shape (n, 2) with the path coordinates.
     frac (float): Smoothing fraction for Lowess algorithm.
 
     Returns:
-    list: Smoothed coordinates.
+    np.ndarray: Smoothed coordinates.
     """
-    x = np.array([coord[0] for coord in coords])
-    y = np.array([coord[1] for coord in coords])
-    smoother = LowessSmoother(smooth_fraction=frac, iterations=1)
-    smoother.smooth(y)
-    return list(zip(x, smoother.smooth_data[0]))
+    x = coords[:, 0]
+    # it=0 is a single non-robust pass, as with tsmoothie's iterations=1; points within delta of the last
+    # local fit are linearly interpolated instead of fitted, with delta a small fraction of the smoothing window
+    delta = 0.02 * frac * np.ptp(x)
+    y_smoothed = lowess(coords[:, 1], x, frac=frac, it=0, delta=delta, return_sorted=False)
+    return np.column_stack([x, y_smoothed])
 
 # Function for Visvalingam-Whyatt Algorithm
 def visvalingam_whyatt_subsampling(coords, tolerance):
@@ -154,132 +161,162 @@ def visvalingam_whyatt_subsampling(coords, tolerance):
     Simplifies the geometry by removing points with the least perceptible change using the Visvalingam-Whyatt algorithm.
 
     Parameters:
-    coords (list): List of coordinate tuples.
+    coords (np.ndarray): Array of shape (n, 2) with the path coordinates.
     tolerance (float): Tolerance for simplification.
 
     Returns:
-    list: Simplified coordinates.
+    np.ndarray: Simplified coordinates.
     """
     return simplify_coords_vw(coords, tolerance)
 
+# Subsampling algorithms applied at each level, keyed by method name; each takes (coords, level)
+SUBSAMPLING_METHODS = {
+    'rdp': simplify_coords,
+    'uniform': uniform_subsampling,
+    'random': random_subsampling,
+    'sliding_window': sliding_window_subsampling,
+    'grid': grid_subsampling,
+    'lowess': lambda coords, level: lowess_subsampling(coords, min(max(level / 1000.0, 0.01), 0.99)),  # Ensure smooth_fraction is within (0,1)
+    'vw': visvalingam_whyatt_subsampling,
+}
+
 # Wrapper function for saving GeoDataFrame to file
 def to_file_wrapper(gdf, filepath, layer_name):
     """
-    Wrapper function to save GeoDataFrame to a file, used for profiling.
+    Wrapper function to append a GeoDataFrame to a GeoPackage layer in one batch via pyogrio, used for profiling.
+    The layer is created on first write.
 
     Parameters:
     gdf (GeoDataFrame): GeoDataFrame to save.
     filepath (str): File path to save the GeoDataFrame.
     layer_name (str): Name of the layer in the GeoPackage.
     """
-    gdf.to_file(filepath, layer=layer_name, driver="GPKG", if_exists='replace')
+    pyogrio.write_dataframe(gdf, filepath, layer=layer_name, driver="GPKG", append=True)
+
+# Initializer for worker processes in add_synthetic_data_to_gpkg
+def _init_worker():
+    """
+    Reseeds the random generator in the worker process, so forked workers do not all draw the same random subsample.
+    """
+    global _rng
+    _rng = np.random.default_rng()
+
+# Function to merge per-file GeoPackages into one
+def merge_gpkg_parts(gpkg_filepath, part_filepaths):
+    """
+    Appends every layer of each part GeoPackage to the GeoPackage of the same name, in order, then deletes the parts.
+
+    Parameters:
+    gpkg_filepath (str): File path to the merged GeoPackage.
+    part_filepaths (list): List of file paths to the part GeoPackages.
+    """
+    for part_filepath in part_filepaths:
+        for layer_name, _ in pyogrio.list_layers(part_filepath):
+            gdf = pyogrio.read_dataframe(part_filepath, layer=layer_name)
+            pyogrio.write_dataframe(gdf, gpkg_filepath, layer=layer_name, driver="GPKG", append=True)
+        os.remove(part_filepath)
 
 # Function to process data and create GeoPackage
-def process_data(csv_filepath, gpkg_filepath, subsample_levels):
+def process_data(coords_arr, gpkg_filepath, subsample_levels):
     """
     Processes the synthetic data, applies subsampling algorithms, and saves the results to a GeoPackage.
     Also profiles memory usage, duration, and file size.
 
     Parameters:
-    csv_filepath (str): File path to the CSV file containing the synthetic data.
+    coords_arr (np.ndarray): C-ordered float64 array of shape (n, 2) with the flight path coordinates,
+        shared read-only by every subsampler and level.
     gpkg_filepath (str): File path to the GeoPackage to save the subsampled data.
     subsample_levels (list): List of levels for subsampling.
 
     Returns:
     list: Profiling results for each subsampling method.
     """
-    data = pd.read_csv(csv_filepath)
-    coords = data[['ps71_easting', 'ps71_northing']].values.tolist()
-
-    # Initialize GeoDataFrames for each subsampling method
-    gdfs = {
-        'rdp': gpd.GeoDataFrame(columns=["geometry"]),
-        'uniform': gpd.GeoDataFrame(columns=["geometry"]),
-        'random': gpd.GeoDataFrame(columns=["geometry"]),
-        'sliding_window': gpd.GeoDataFrame(columns=["geometry"]),
-        'grid': gpd.GeoDataFrame(columns=["geometry"]),
-        'lowess': gpd.GeoDataFrame(columns=["geometry"]),
-        'vw': gpd.GeoDataFrame(columns=["geometry"]),
-        'full': gpd.GeoDataFrame(columns=["geometry"])
-    }
+    # Collect geometries for each subsampling method; GeoDataFrames are built once at the end
+    geoms = {method: [] for method in (*SUBSAMPLING_METHODS, 'full')}
 
     # Add full resolution data as MultiPoint
-    points_full = MultiPoint(coords)
-    gdfs['full'] = pd.concat([gdfs['full'], gpd.GeoDataFrame([[points_full]], columns=["geometry"])], ignore_index=True)
-
-    # Apply each subsampling algorithm at different levels
-    for level in subsample_levels:
-        subsampled_coords_rdp = rdp(coords, epsilon=level)
-        subsampled_coords_uniform = uniform_subsampling(coords, level)
-        subsampled_coords_random = random_subsampling(coords, level)
-        subsampled_coords_sliding_window = sliding_window_subsampling(coords, level)
-        subsampled_coords_grid = grid_subsampling(coords, level)
-        smooth_frac = min(max(level / 1000.0, 0.01), 0.99)  # Ensure smooth_fraction is within (0,1)
-        subsampled_coords_lowess = lowess_subsampling(coords, smooth_frac)
-        subsampled_coords_vw = visvalingam_whyatt_subsampling(coords, level)
-
-        # Create LineString for each subsampling method and add to corresponding GeoDataFrame
-        if len(subsampled_coords_rdp) > 1:
-            line_rdp = LineString(subsampled_coords_rdp)
-            gdfs['rdp'] = pd.concat([gdfs['rdp'], gpd.GeoDataFrame([[line_rdp]], columns=["geometry"])], ignore_index=True)
-        if len(subsampled_coords_uniform) > 1:
-            line_uniform = LineString(subsampled_coords_uniform)
-            gdfs['uniform'] = pd.concat([gdfs['uniform'], gpd.GeoDataFrame([[line_uniform]], columns=["geometry"])], ignore_index=True)
-        if len(subsampled_coords_random) > 1:
-            line_random = LineString(subsampled_coords_random)
-            gdfs['random'] = pd.concat([gdfs['random'], gpd.GeoDataFrame([[line_random]], columns=["geometry"])], ignore_index=True)
-        if len(subsampled_coords_sliding_window) > 1:
-            line_sliding_window = LineString(subsampled_coords_sliding_window)
-            gdfs['sliding_window'] = pd.concat([gdfs['sliding_window'], gpd.GeoDataFrame([[line_sliding_window]], columns=["geometry"])], ignore_index=True)
-        if len(subsampled_coords_grid) > 1:
-            line_grid = LineString(subsampled_coords_grid)
-            gdfs['grid'] = pd.concat([gdfs['grid'], gpd.GeoDataFrame([[line_grid]], columns=["geometry"])], ignore_index=True)
-        if len(subsampled_coords_lowess) > 1:
-            line_lowess = LineString(subsampled_coords_lowess)
-            gdfs['lowess'] = pd.concat([gdfs['lowess'], gpd.GeoDataFrame([[line_lowess]], columns=["geometry"])], ignore_index=True)
-        if len(subsampled_coords_vw) > 1:
-            line_vw = LineString(subsampled_coords_vw)
-            gdfs['vw'] = pd.concat([gdfs['vw'], gpd.GeoDataFrame([[line_vw]], columns=["geometry"])], ignore_index=True)
+    geoms['full'].append(shapely.multipoints(coords_arr))
+
+    # Apply each subsampling algorithm at different levels, running the independent algorithms concurrently
+    with ThreadPoolExecutor(max_workers=len(SUBSAMPLING_METHODS)) as executor:
+        futures = [
+            {method: executor.submit(subsample, coords_arr, level) for method, subsample in SUBSAMPLING_METHODS.items()}
+            for level in subsample_levels
+        ]
+
+    # Create LineString for each subsampling method and add to corresponding geometry list
+    for level_futures in futures:
+        for method, future in level_futures.items():
+            subsampled_coords = future.result()
+            if len(subsampled_coords) > 1:
+                geoms[method].append(shapely.linestrings(subsampled_coords))
+
+    # Build each GeoDataFrame once, in Antarctic Polar Stereographic
+    gdfs = {method: gpd.GeoDataFrame({'geometry': method_geoms}, crs="EPSG:3031") for method, method_geoms in geoms.items()}
 
     # Save each GeoDataFrame to the GeoPackage and profile memory and duration
     profiling_results = []
     for method, gdf in gdfs.items():
-        gdf.crs = "EPSG:3031"  # Set Coordinate Reference System to Antarctic Polar Stereographic
         layer_name = f'{method}_synthetic_layer'
 
         start_time = time.time()
-        mem_usage = memory_usage((to_file_wrapper, (gdf, gpkg_filepath, layer_name)), interval=0.1)
+        tracemalloc.start()
+        to_file_wrapper(gdf, gpkg_filepath, layer_name)
+        _, peak = tracemalloc.get_traced_memory()  # Peak of Python-level allocations during the write
+        tracemalloc.stop()
         duration = time.time() - start_time
+        peak_memory_usage = peak / (1024 * 1024)  # Convert peak memory to MB
         file_size = os.path.getsize(gpkg_filepath) / (1024 * 1024)  # Convert file size to MB
 
         profiling_results.append({
             'method': method,
-            'peak_memory_usage_mb': max(mem_usage),
+            'peak_memory_usage_mb': peak_memory_usage,
             'duration_sec': duration,
             'file_size_mb': file_size
         })
 
-        print(f"Added {layer_name} with peak memory usage: {max(mem_usage)} MB, duration: {duration} sec, file size: {file_size} MB")
+        print(f"Added {layer_name} with peak memory usage: {peak_memory_usage} MB, duration: {duration} sec, file size: {file_size} MB")
 
     return profiling_results
 
 # Function to add synthetic data to GeoPackage
-def add_synthetic_data_to_gpkg(gpkg_filepath, csv_filepaths, subsample_levels):
+def add_synthetic_data_to_gpkg(gpkg_filepath, datasets, subsample_levels):
     """
-    Processes each CSV file to add synthetic data to the GeoPackage.
+    Processes each in-memory flight path in a separate worker process to add synthetic data to the GeoPackage.
+    Each path is written to its own part GeoPackage, so workers never share an SQLite database; the parts
+    are merged into the GeoPackage afterwards.
 
     Parameters:
     gpkg_filepath (str): File path to the GeoPackage.
-    csv_filepaths (list): List of file paths to the CSV files containing the synthetic data.
+    datasets (list): A list of Pandas DataFrames, each representing a synthetic flight path.
     subsample_levels (list): List of levels for subsampling.
 
     Returns:
     list: Aggregated profiling results for each subsampling method.
     """
-    profiling_results = []
-    for csv_filepath in csv_filepaths:
-        results = process_data(csv_filepath, gpkg_filepath, subsample_levels)
-        profiling_results.extend(results)
+    # Every path appends to the same layers, so start from an empty GeoPackage
+    if os.path.exists(gpkg_filepath):
+        os.remove(gpkg_filepath)
+
+    # Only the coordinates are sent to the workers, as C-ordered (n, 2) float64 arrays
+    coords_arrs = [
+        np.column_stack([df['ps71_easting'].to_numpy(dtype=np.float64), df['ps71_northing'].to_numpy(dtype=np.float64)])
+        for df in datasets
+    ]
+
+    part_filepaths = [f'{gpkg_filepath}.part{i}.gpkg' for i in range(len(datasets))]
+    for part_filepath in part_filepaths:
+        if os.path.exists(part_filepath):
+            os.remove(part_filepath)
+
+    max_workers = max(1, min(len(datasets), os.cpu_count() or 1))
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as executor:
+        results = executor.map(process_data, coords_arrs, part_filepaths, repeat(subsample_levels))
+        profiling_results = []
+        for file_results in results:
+            profiling_results.extend(file_results)
+
+    merge_gpkg_parts(gpkg_filepath, part_filepaths)
     return profiling_results
 
 # Save profiling results to a CSV file
@@ -298,15 +335,20 @@ def save_profiling_results(profiling_results, filename):
             writer.writerow(result)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Subsample synthetic flight paths into a GeoPackage and profile the layer writes.")
+    parser.add_argument('--emit-csv', action='store_true', help="Also save each synthetic flight path to a CSV file.")
+    args = parser.parse_args()
+
     num_points = 10000  # Number of points per flight path
     num_paths = 5  # Number of flight paths to generate
     datasets = create_flight_paths(num_points, num_paths)  # Generate synthetic flight paths
-    csv_filepaths = save_csv_files(datasets)  # Save flight paths to CSV files
+    if args.emit_csv:
+        save_csv_files(datasets)  # Save flight paths to CSV files; processing uses the in-memory datasets
 
     gpkg_filepath = 'synthetic_data.gpkg'  # File path for the GeoPackage
     subsample_levels = [10, 100, 1000]  # Three levels of subsampling for different zoom levels
 
-    profiling_results = add_synthetic_data_to_gpkg(gpkg_filepath, csv_filepaths, subsample_levels)  # Process data and save to GeoPackage
+    profiling_results = add_synthetic_data_to_gpkg(gpkg_filepath, datasets, subsample_levels)  # Process data and save to GeoPackage
 
     save_profiling_results(profiling_results, 'detailed_profiling_results.csv')  # Save profiling results to CSV
     print("Detailed profiling results saved to detailed_profiling_results.csv")